@@ -5,6 +5,8 @@ A miscellaneous utility for sequential labeling.
 Copyright 2010,2011 Naoaki Okazaki.
 """
 
+import io
+import multiprocessing
 import optparse
 import sys
 
@@ -38,6 +40,53 @@ def apply_templates(X, templates):
             if values:
                 X[t]['F'].append('%s=%s' % (name, '|'.join(values)))
 
+def compile_templates(templates, intern=False):
+    """
+    Compile feature templates into a function equivalent to
+    L{apply_templates}. The returned function takes an item sequence
+    and appends the same features as apply_templates(X, templates),
+    but the field names, offsets, and feature names of the templates
+    are expanded into Python code once, when this function is called.
+
+    @type   templates:  list of tuples of (str, int)
+    @param  templates:  The feature templates.
+    @type   intern:     bool
+    @param  intern:     Intern the generated features with sys.intern()
+                        so that identical features share one string.
+    @rtype              function
+    @return             The function that applies the templates to an
+                        item sequence.
+    """
+    lines = [
+        'def apply(X):',
+        '    n = len(X)',
+        '    for t in range(n):',
+        '        x = X[t]',
+        '        append = x[\'F\'].append',
+        ]
+    for template in templates:
+        name = '|'.join(['%s[%d]' % (f, o) for f, o in template])
+        values = " + '|' + ".join(
+            ['%s[%r]' % ('X[t%+d]' % o if o else 'x', f) for f, o in template])
+        conds = []
+        lo = min([o for f, o in template])
+        hi = max([o for f, o in template])
+        if lo < 0:
+            conds.append('t >= %d' % -lo)
+        if hi > 0:
+            conds.append('t < n - %d' % hi)
+        indent = '        '
+        if conds:
+            lines.append(indent + 'if %s:' % ' and '.join(conds))
+            indent += '    '
+        if intern:
+            lines.append(indent + 'append(intern(%r + %s))' % (name + '=', values))
+        else:
+            lines.append(indent + 'append(%r + %s)' % (name + '=', values))
+    namespace = {'intern': sys.intern}
+    exec('\n'.join(lines) + '\n', namespace)
+    return namespace['apply']
+
 def readiter(fi, names, sep=' '):
     """
     Return an iterator for item sequences read from a file object.
@@ -69,8 +118,7 @@ def readiter(fi, names, sep=' '):
                 raise ValueError(
                     'Too few fields (%d) for %r\n%s' % (len(fields), names, line))
             item = {'F': []}    # 'F' is reserved for features.
-            for i in range(len(names)):
-                item[names[i]] = fields[i]
+            item.update(zip(names, fields))
             X.append(item)
 
 def escape(src):
@@ -130,6 +178,26 @@ def to_crfsuite(X):
         xseq.append(item)
     return xseq
 
+# The feature extractor of a worker process, set by _init_worker().
+_feature_extractor = None
+
+def _init_worker(feature_extractor):
+    global _feature_extractor
+    _feature_extractor = feature_extractor
+
+def _extract(X):
+    # Extract features in a worker process.
+    _feature_extractor(X)
+    return X
+
+def _extract_and_output(X):
+    # Extract features in a worker process, and return them in CRFSuite
+    # format so that the parent process only needs to write a string.
+    _feature_extractor(X)
+    fo = io.StringIO()
+    output_features(fo, X, 'y')
+    return fo.getvalue()
+
 def main(feature_extractor, fields='w pos y', sep=' '):
     fi = sys.stdin
     fo = sys.stdout
@@ -141,7 +209,8 @@ Each line of a data set must consist of field values separated by SEPARATOR
 characters. The names and order of field values can be specified by -f option.
 The separator character can be specified with -s option. Instead of outputting
 attributes, this utility tags the input data when a model file is specified by
--t option (CRFsuite Python module must be installed)."""
+-t option (CRFsuite Python module must be installed). With -p option, features
+of sequences are extracted by multiple processes in parallel."""
         )
     parser.add_option(
         '-t', dest='model',
@@ -155,16 +224,32 @@ attributes, this utility tags the input data when a model file is specified by
         '-s', dest='separator', default=sep,
         help='specify the separator of columns of input data [default: "%default"]'
         )
+    parser.add_option(
+        '-p', dest='processes', type='int', default=1,
+        help='specify the number of processes extracting features [default: %default]'
+        )
     (options, args) = parser.parse_args()
 
     # The fields of input: ('w', 'pos', 'y) by default.
     F = options.fields.split(' ')
 
+    # Worker processes for feature extraction (sequences are sent to the
+    # workers in chunks of 256; the results keep the input order).
+    pool = None
+    if options.processes > 1:
+        pool = multiprocessing.Pool(
+            options.processes, _init_worker, (feature_extractor,))
+
     if not options.model:
         # The generator function readiter() reads a sequence from a 
-        for X in readiter(fi, F, options.separator):
-            feature_extractor(X)
-            output_features(fo, X, 'y')
+        if pool is None:
+            for X in readiter(fi, F, options.separator):
+                feature_extractor(X)
+                output_features(fo, X, 'y')
+        else:
+            for s in pool.imap(
+                    _extract_and_output, readiter(fi, F, options.separator), 256):
+                fo.write(s)
 
     else:
         # Create a tagger with an existing model.
@@ -172,10 +257,17 @@ attributes, this utility tags the input data when a model file is specified by
         tagger = crfsuite.Tagger()
         tagger.open(options.model)
 
+        # Obtain features of the sequences from STDIN.
+        if pool is None:
+            def extract(X):
+                feature_extractor(X)
+                return X
+            XS = map(extract, readiter(fi, F, options.separator))
+        else:
+            XS = pool.imap(_extract, readiter(fi, F, options.separator), 256)
+
         # For each sequence from STDIN.
-        for X in readiter(fi, F, options.separator):
-            # Obtain features.
-            feature_extractor(X)
+        for X in XS:
             xseq = to_crfsuite(X)
             yseq = tagger.tag(xseq)
             for t in range(len(X)):
@@ -183,3 +275,7 @@ attributes, this utility tags the input data when a model file is specified by
                 fo.write('\t'.join([v[f] for f in F]))
                 fo.write('\t%s\n' % yseq[t])
             fo.write('\n')
+
+    if pool is not None:
+        pool.close()
+        pool.join()
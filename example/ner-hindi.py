@@ -5,29 +5,41 @@ A feature extractor for named eneity recognition (NER).
 Copyright 2010,2011 Naoaki Okazaki.
 """
 
-days = {}
-def prepareDict_days():
-    f = open('days.txt','r')
-    all_lines = f.readlines()
-    for line in all_lines:
-        name = (line.split())[0]
-        days[name]=1
-
-months = {}
-def prepareDict_months():
-    f = open('months.txt','r')
-    all_lines = f.readlines()
-    for line in all_lines:
-        name = (line.split())[0]
-        months[name]=1
-
-money = {}
-def prepareDict_money():
-    f = open('money.txt','r')
-    all_lines = f.readlines()
-    for line in all_lines:
-        name = (line.split())[0]
-        money[name]=1
+import os
+import sys
+
+# Gazetteer features: days, months, and money. Add a feature here only
+# together with its data file (see GAZ below).
+GAZ_FEATURES = ('gaz-d', 'gaz-mo', 'gaz-mn')
+GAZ_NONE = ('0',) * len(GAZ_FEATURES)
+
+def load_gaz(path):
+    # Read the first field of each non-empty line, decoding only that field.
+    with open(path, 'rb') as f:
+        lines = f.read().split(b'\n')
+    return frozenset(
+        sys.intern(line.split(None, 1)[0].decode('utf-8'))
+        for line in lines if line.strip()
+        )
+
+def load_gazetteers(paths):
+    # Build the table for GAZ from a mapping of gazetteer feature names to
+    # file names.
+    gaz = {}
+    for i, name in enumerate(GAZ_FEATURES):
+        for word in load_gaz(paths[name]):
+            gaz.setdefault(word, list(GAZ_NONE))[i] = '1'
+    return {word: tuple(values) for word, values in gaz.items()}
+
+# Values of the gazetteer features for every word in any of the gazetteers.
+# The gazetteers are loaded when this module is imported (rather than in the
+# main block) so that worker processes started by crfutils.main() have them.
+gazdir = os.path.dirname(os.path.abspath(__file__))
+GAZ = load_gazetteers({
+    'gaz-d': os.path.join(gazdir, 'days.txt'),
+    'gaz-mo': os.path.join(gazdir, 'months.txt'),
+    'gaz-mn': os.path.join(gazdir, 'money.txt'),
+    })
 
 
 # Separator of field values.
@@ -37,39 +49,32 @@ separator = ' '
 fields = 'y w pos chk'
 
 
+import string
+from functools import lru_cache
+from itertools import groupby
 import crfutils
 
-#print "OK"
+# Character-class table for get_shape(); characters not listed here
+# (e.g., Devanagari letters and signs) are kept as they are. Unlike
+# str.isupper/islower/isdigit, this covers only ASCII letters and ASCII and
+# Devanagari digits, so 'É', 'é', and '²' are not mapped to 'U', 'L', 'D'.
+SHAPE_TABLE = str.maketrans(
+    dict.fromkeys(string.ascii_uppercase, 'U') |
+    dict.fromkeys(string.ascii_lowercase, 'L') |
+    dict.fromkeys(string.digits + '\u0966\u0967\u0968\u0969\u096a'
+                  '\u096b\u096c\u096d\u096e\u096f', 'D') |
+    dict.fromkeys('.,', '.') |
+    dict.fromkeys(';:?!', ';') |
+    dict.fromkeys('+-*/=|_', '-') |
+    dict.fromkeys('({[<', '(') |
+    dict.fromkeys(')}]>', ')')
+    )
+
 def get_shape(token):
-#    print "1 call"
-    r = ''
-    for c in token:
-        if c.isupper():
-            r += 'U'
-        elif c.islower():
-            r += 'L'
-        elif c.isdigit():
-            r += 'D'
-        elif c in ('.', ','):
-            r += '.'
-        elif c in (';', ':', '?', '!'):
-            r += ';'
-        elif c in ('+', '-', '*', '/', '=', '|', '_'):
-            r += '-'
-        elif c in ('(', '{', '[', '<'):
-            r += '('
-        elif c in (')', '}', ']', '>'):
-            r += ')'
-        else:
-            r += c
-    return r
+    return token.translate(SHAPE_TABLE)
 
 def degenerate(src):
-    dst = ''
-    for c in src:
-        if not dst or dst[-1] != c:
-            dst += c
-    return dst
+    return ''.join(c for c, _ in groupby(src))
 '''
 def get_type(token):
     T = (
@@ -119,11 +124,6 @@ def get_type(token):
     return 'NO'
 '''
 
-def get_2d(token):
-    return len(token) == 2 and token.isdigit()
-
-def get_4d(token):
-    return len(token) == 4 and token.isdigit()
 '''
 def get_da(token):
     bd = False
@@ -138,23 +138,6 @@ def get_da(token):
     return bd and ba
 '''
 
-def get_dand(token, p):
-    bd = False
-    bdd = False
-    for c in token:
-        if c.isdigit():
-            bd = True
-        elif c == p:
-            bdd = True
-        else:
-            return False
-    return bd and bdd
-
-def get_all_other(token):
-    for c in token:
-        if c.isalnum():
-            return False
-    return True
 '''
 def get_capperiod(token):
     return len(token) == 2 and token[0].isupper() and token[1] == '.'
@@ -184,204 +167,163 @@ def contains_alpha(token):
         b |= c.isalpha()
     return b
 '''
-def contains_digit(token):
-    b = False
+# Values of the features (nnp, nnpc, nnc, qc) for each POS tag.
+POS_TABLE = {
+    'NNP':  ('yes', 'no', 'no', 'no'),
+    'NNPC': ('no', 'yes', 'no', 'no'),
+    'NNC':  ('no', 'no', 'yes', 'no'),
+    'QC':   ('no', 'no', 'no', 'yes'),
+    }
+POS_NONE = ('no', 'no', 'no', 'no')
+
+# Classify the characters of a token in a single pass. This returns a tuple
+# (cd, ad, ao, cs, sep, do, col, and), where cd is True if the token contains
+# a digit, ad if all characters are digits, ao if no character is
+# alphanumeric, cs if some character is not alphanumeric, sep is the
+# separator character p if the token consists only of digits and p (e.g.,
+# '-' for '12-3'; None otherwise), and do, col, and tell whether the token
+# contains '$', ':', and '&', respectively.
+def classify(token):
+    digit = False
+    alnum = False
+    symbol = False
+    others = set()
     for c in token:
-        b |= c.isdigit()
-    return b
-
-def contains_symbol(token):
-    b = False
-    for c in token:
-        b |= ~c.isalnum()
-    return b
-
-# new feature $
-def contains_dollar(token):
-    if'$' in token:
-        return True
-    else:
-        return False
-
-# new feature :
-def contains_collen(token):
-    if':' in token:
-        return True
-    else:
-        return False
-
-# new feature &
-def contains_and(token):
-    if'&' in token:
-        return True
-    else:
-        return False
-
-# new feature Rs
-def contains_rupees(token):
-    if'rs' in token:
-        return True
-    else:
-        return False
-
-# new feature ji
-def contains_ji(token):
-    if'जी' in token:
-        return True
-    else:
-        return False
-
-
-# new feature baje
-def contains_baje(token):
-    if'बजे' in token:
-        return True
-    else:
-        return False
-
-
-# pos tag = 'NNP'
-def get_NNP(token):
-    if 'NNP' in token:
-        return True
-    else:
-        return False
-
-# pos tag = 'NNPC'
-def get_NNPC(token):
-    if 'NNPC' in token:
-        return True
-    else:
-        return False
-
-# pos tag = 'NNC'
-def get_NNC(token):
-    if 'NNC' in token:
-        return True
-    else:
-        return False
+        if c.isdigit():
+            digit = True
+            alnum = True
+        else:
+            if c.isalnum():
+                alnum = True
+            else:
+                symbol = True
+            others.add(c)
+    sep = None
+    if digit and len(others) == 1:
+        sep, = others
+    return (
+        digit, digit and not others, not alnum, symbol, sep,
+        '$' in others, ':' in others, '&' in others,
+        )
 
-# pos tag = 'QC'
-def get_QC(token):
-    if 'QC' in token:
-        return True
-    else:
-        return False
-	
+# Substrings for the features ji and baje, encoded in UTF-8.
+JI = 'जी'.encode('utf-8')
+BAJE = 'बजे'.encode('utf-8')
 
 def b(v):
     return 'yes' if v else 'no'
 
 def observation(v, defval=''):
+    v.update(observe(v['w'], v['pos'], defval))
+
+# Compute the observations of a token. Tokens recur often in a corpus, so the
+# results are cached; the returned mapping is shared and must not be modified.
+@lru_cache(maxsize=65536)
+def observe(w, pos, defval=''):
+    v = {}
+
     # Lowercased token.
-    v['wl'] = v['w'].lower()
+    v['wl'] = w.lower()
     # Token shape.
-    v['shape'] = get_shape(v['w'])
+    v['shape'] = get_shape(w)
     # Token shape degenerated.
     v['shaped'] = degenerate(v['shape'])
     # Token type.
-#    v['type'] = get_type(v['w'])
+#    v['type'] = get_type(w)
+
+    # Prefixes and suffixes longer than the token are set to defval; the
+    # one-character ones need no length check.
+    n = len(w)
 
     # Prefixes (length between one to four).
-    v['p1'] = v['w'][0] if len(v['w']) >= 1 else defval
-    v['p2'] = v['w'][:2] if len(v['w']) >= 2 else defval
-    v['p3'] = v['w'][:3] if len(v['w']) >= 3 else defval
-    v['p4'] = v['w'][:4] if len(v['w']) >= 4 else defval
+    v['p1'] = w[:1] or defval
+    v['p2'] = w[:2] if n >= 2 else defval
+    v['p3'] = w[:3] if n >= 3 else defval
+    v['p4'] = w[:4] if n >= 4 else defval
 
     # Suffixes (length between one to four).
-    v['s1'] = v['w'][-1] if len(v['w']) >= 1 else defval
-    v['s2'] = v['w'][-2:] if len(v['w']) >= 2 else defval
-    v['s3'] = v['w'][-3:] if len(v['w']) >= 3 else defval
-    v['s4'] = v['w'][-4:] if len(v['w']) >= 4 else defval
+    v['s1'] = w[-1:] or defval
+    v['s2'] = w[-2:] if n >= 2 else defval
+    v['s3'] = w[-3:] if n >= 3 else defval
+    v['s4'] = w[-4:] if n >= 4 else defval
+
+    # Scan the token once for the character-class features below.
+    cd, ad, ao, cs, sep, do, col, amp = classify(w)
+    # UTF-8 bytes of the token for the substring features.
+    wb = w.encode('utf-8')
 
     # Two digits
-    v['2d'] = b(get_2d(v['w']))
+    v['2d'] = b(ad and n == 2)
     # Four digits.
-    v['4d'] = b(get_4d(v['w']))
+    v['4d'] = b(ad and n == 4)
     # Alphanumeric token.
-#    v['d&a'] = b(get_da(v['w']))
+#    v['d&a'] = b(get_da(w))
     # Digits and '-'.
-    v['d&-'] = b(get_dand(v['w'], '-'))
+    v['d&-'] = b(sep == '-')
     # Digits and '/'.
-    v['d&/'] = b(get_dand(v['w'], '/'))
+    v['d&/'] = b(sep == '/')
     # Digits and ','.
-    v['d&,'] = b(get_dand(v['w'], ','))
+    v['d&,'] = b(sep == ',')
     # Digits and '.'.
-    v['d&.'] = b(get_dand(v['w'], '.'))
+    v['d&.'] = b(sep == '.')
     # A uppercase letter followed by '.'
-#    v['up'] = b(get_capperiod(v['w']))
+#    v['up'] = b(get_capperiod(w))
 
     # For 's 
-    v['as'] = b(get_appos(v['w']))
+    v['as'] = b(get_appos(w))
 
     # An initial uppercase letter.
-#   v['iu'] = b(v['w'] and v['w'][0].isupper())
+#   v['iu'] = b(w and w[0].isupper())
     # All uppercase letters.
-#    v['au'] = b(v['w'].isupper())
+#    v['au'] = b(w.isupper())
     # All lowercase letters.
-#    v['al'] = b(v['w'].islower())
+#    v['al'] = b(w.islower())
     # All digit letters.
-    v['ad'] = b(v['w'].isdigit())
+    v['ad'] = b(ad)
     # All other (non-alphanumeric) letters.
-    v['ao'] = b(get_all_other(v['w']))
+    v['ao'] = b(ao)
 
     # Contains a uppercase letter.
-#    v['cu'] = b(contains_upper(v['w']))
+#    v['cu'] = b(contains_upper(w))
     # Contains a lowercase letter.
-#    v['cl'] = b(contains_lower(v['w']))
+#    v['cl'] = b(contains_lower(w))
     # Contains a alphabet letter.
-#    v['ca'] = b(contains_alpha(v['w']))
+#    v['ca'] = b(contains_alpha(w))
     # Contains a digit.
-    v['cd'] = b(contains_digit(v['w']))
+    v['cd'] = b(cd)
     # Contains a symbol.
-    v['cs'] = b(contains_symbol(v['w']))
+    v['cs'] = b(cs)
 
     # Contains $ as symbol
-    v['do'] = b(contains_dollar(v['w'])) 
+    v['do'] = b(do)
     # Contains Rs as symbol
-    v['rs'] = b(contains_rupees(v['w']))
+    v['rs'] = b(b'rs' in wb)
     # Contains : as symbol
-    v['col'] = b(contains_collen(v['w']))
+    v['col'] = b(col)
     # Contains & as symbol
-    v['and'] = b(contains_and(v['w']))
+    v['and'] = b(amp)
     # Contains जी 
-    v['ji'] = b(contains_ji(v['w']))
+    v['ji'] = b(JI in wb)
     # Contains बजे
-    v['baje'] = b(contains_baje(v['w']))
-
-    # Get Pos = NNP
-    v['nnp'] = b(get_NNP(v['pos']))
-    # Get Pos = NNC
-    v['nnc'] = b(get_NNC(v['pos']))
-    # Get Pos = NNPC
-    v['nnpc'] = b(get_NNC(v['pos']))
-    # Get Pos = NNP
-    v['qc'] = b(get_QC(v['pos']))
-
-    # gazzater for days
-    v['gaz-d'] = '0'    
-    if v['w'] in days:
-        v['gaz-d'] = '1'
-
-    # gazzater for months
-    v['gaz-m'] = '0'    
-    if v['w'] in months:
-        v['gaz-m'] = '1'
-
-    # gazzater for money
-    v['gaz-m'] = '0'    
-    if v['w'] in money:
-        v['gaz-m'] = '1'
-
-
-
-def disjunctive(X, t, field, begin, end):
-    name = '%s[%d..%d]' % (field, begin, end)
-    for offset in range(begin, end+1):
-        p = t + offset
-        if p not in range(0, len(X)):
-            continue
-        X[t]['F'].append('%s=%s' % (name, X[p][field]))
+    v['baje'] = b(BAJE in wb)
+
+    # Pos = NNP, NNPC, NNC, QC
+    v['nnp'], v['nnpc'], v['nnc'], v['qc'] = POS_TABLE.get(pos, POS_NONE)
+
+    # gazzaters (one lookup for all of them)
+    v.update(zip(GAZ_FEATURES, GAZ.get(w, GAZ_NONE)))
+
+    return v
+
+
+
+# Append disjunctive features to the item t, taking the field values from
+# the list V (the values of the field for all items in the sequence).
+def disjunctive(X, V, t, field, begin, end):
+    name = '%s[%d..%d]=' % (field, begin, end)
+    lo = max(t + begin, 0)
+    hi = max(t + end + 1, 0)
+    X[t]['F'].extend([name + v for v in V[lo:hi]])
 
 U = [
     'w', 'wl', 'pos', 'chk', 'shape', 'shaped',
@@ -392,8 +334,8 @@ U = [
     'cd', 'cs',
     'as','do','rs','nnp','nnc','qc','nnpc',
     'col','and','ji','baje',
-    'gaz-d','gaz-m','gaz-l','gaz-a','gaz-m','gaz-e','gaz-lt','gaz-p','gaz-lm'
-    ]
+    ] + list(GAZ_FEATURES)
+assert len(U) == len(set(U))
 B = ['w', 'pos', 'chk', 'shaped']
 
 templates = []
@@ -401,6 +343,7 @@ for name in U:
     templates += [((name, i),) for i in range(-2, 3)]
 for name in B:
     templates += [((name, i), (name, i+1)) for i in range(-2, 2)]
+apply_my_templates = crfutils.compile_templates(templates)
 
 def feature_extractor(X):
 #    print "in feature_extractor"
@@ -409,12 +352,13 @@ def feature_extractor(X):
         observation(x)
 
     # Apply the feature templates.
-    crfutils.apply_templates(X, templates)
+    apply_my_templates(X)
 
     # Append disjunctive features.
+    W = [x['w'] for x in X]
     for t in range(len(X)):
-        disjunctive(X, t, 'w', -4, -1)
-        disjunctive(X, t, 'w', 1, 4)
+        disjunctive(X, W, t, 'w', -4, -1)
+        disjunctive(X, W, t, 'w', 1, 4)
 
     # Append BOS and EOS features.
     if X:
@@ -422,13 +366,4 @@ def feature_extractor(X):
         X[-1]['F'].append('__EOS__')
 
 if __name__ == '__main__':
-    prepareDict_days()
-    prepareDict_months()
-    prepareDict_locations()
-    prepareDict_artifacts()
-    prepareDict_money()
-    prepareDict_entertainment()
-    prepareDict_livingthings()
-    prepareDict_plants()
-    prepareDict_locomotives()
     crfutils.main(feature_extractor, fields=fields, sep=separator)